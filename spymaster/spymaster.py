@@ -6,8 +6,11 @@ import time
 import csv
 import multiprocessing as mp
 import shutil
-from itertools import chain as _chain
-from json import dump as _json_dump
+import tempfile
+from collections import namedtuple as _namedtuple
+from itertools import zip_longest as _zip_longest
+from json import JSONEncoder as _JSONEncoder
+from datetime import timezone as _timezone
 
 import libmft.api
 from libmft.flagsandtypes import AttrTypes, FileInfoFlags, MftUsageFlags
@@ -16,6 +19,16 @@ from libmft.exceptions import DataStreamError
 import dateutil #https://dateutil.readthedocs.io/en/stable/index.html
 import dateutil.zoneinfo
 
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
+try:
+    import zoneinfo as _zoneinfo
+except ImportError:
+    _zoneinfo = None
+
 _MOD_LOGGER = logging.getLogger(__name__)
 
 _CSV_COLUMN_ORDER = ["entry_n", "is_deleted", "is_directory", "is_ads", "path",
@@ -23,6 +36,32 @@ _CSV_COLUMN_ORDER = ["entry_n", "is_deleted", "is_directory", "is_ads", "path",
                 "std_created", "std_changed", "std_mft_change", "std_accessed",
                 "fn_created", "fn_changed", "fn_mft_change", "fn_accessed",
                 "readonly", "hidden", "system", "encrypted"]
+#a record generated for an entry, the fields follow the csv column order
+EntryData = _namedtuple("EntryData", _CSV_COLUMN_ORDER)
+#position of the timestamps inside a record
+_STD_TIMES = slice(_CSV_COLUMN_ORDER.index("std_created"), _CSV_COLUMN_ORDER.index("std_accessed") + 1)
+_FN_TIMES = slice(_CSV_COLUMN_ORDER.index("fn_created"), _CSV_COLUMN_ORDER.index("fn_accessed") + 1)
+#amount of records kept in memory before they are written to the file
+_WRITE_BATCH_SIZE = 4096
+#buffer size, in bytes, of the output files
+_OUTPUT_BUFFER_SIZE = 1024 * 1024
+#chunk size, in bytes, used to copy the intermediate files when merging
+_MERGE_CHUNK_SIZE = 4 * 1024 * 1024
+#only Linux accepts regular files as sendfile destination
+_USE_SENDFILE = sys.platform.startswith("linux")
+_DEFAULT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+#timezone names that are the same as the one the timestamps are read with
+_UTC_NAMES = ("UTC", "Etc/UTC")
+
+#the json output is written as utf-8, non ascii characters are not escaped
+#orjson is optional, but a lot faster. Both produce the same output
+if _orjson is not None:
+    def _json_encode(data):
+        return _orjson.dumps(data).decode("utf-8")
+else:
+    _json_encode = _JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+#the json output is an array with one record per line
+_JSON_SEPARATOR = ",\n"
 
 class SpymasterError(Exception):
     """ 'Generic' error class for the script"""
@@ -31,88 +70,147 @@ class SpymasterError(Exception):
 #------------------------------------------------------------------------------
 # OUTPUT SECTION
 #------------------------------------------------------------------------------
+def _format_default_time(value):
+    """Same result as strftime with the default time format, but faster.
+    The timezone offset added by isoformat is cut out.
+    """
+    return value.isoformat(" ", "seconds")[:19]
+
+class TimestampFormatter():
+    """Converts the four timestamps of an attribute to strings.
+
+    All the records generated by one entry (ADS and hardlinks) have the same
+    timestamps, as such, the last conversion is kept and reused if the same
+    timestamps are requested again.
+    """
+    def __init__(self, time_format):
+        self._last_key = None
+        self._last_result = None
+        if time_format == _DEFAULT_TIME_FORMAT:
+            self._convert = _format_default_time
+        else:
+            self._convert = lambda value: value.strftime(time_format)
+
+    def format(self, times):
+        created, changed, mft_changed, accessed = times
+        #times in the same timezone compare by the wall clock, which is the same
+        #for both passes of a repeated DST hour. Only the fold tells them apart
+        key = (times, created.fold, changed.fold, mft_changed.fold, accessed.fold)
+        if key != self._last_key:
+            convert = self._convert
+            self._last_key = key
+            self._last_result = (convert(created), convert(changed),
+                convert(mft_changed), convert(accessed))
+
+        return self._last_result
+
 class OutputCSV():
     """Controls file output when the csv format is selected.
     """
+    merge_separator = ""
+
     def __init__(self, filename, args):
         self.filename = filename
         self.fp = None
         self.writer = None
-        self.time_format = args.time_format
+        self._std_formatter = TimestampFormatter(args.time_format)
+        self._fn_formatter = TimestampFormatter(args.time_format)
+        self._buffer = []
 
     def _adjust_data(self, single_data):
-        if single_data["std_created"]:
-            single_data["std_created"] = single_data["std_created"].strftime(self.time_format)
-            single_data["std_changed"] = single_data["std_changed"].strftime(self.time_format)
-            single_data["std_mft_change"] = single_data["std_mft_change"].strftime(self.time_format)
-            single_data["std_accessed"] = single_data["std_accessed"].strftime(self.time_format)
-        if single_data["fn_created"]:
-            single_data["fn_created"] = single_data["fn_created"].strftime(self.time_format)
-            single_data["fn_changed"] = single_data["fn_changed"].strftime(self.time_format)
-            single_data["fn_mft_change"] = single_data["fn_mft_change"].strftime(self.time_format)
-            single_data["fn_accessed"] = single_data["fn_accessed"].strftime(self.time_format)
+        std_times, fn_times = single_data[_STD_TIMES], single_data[_FN_TIMES]
+        if single_data.std_created:
+            std_times = self._std_formatter.format(std_times)
+        if single_data.fn_created:
+            fn_times = self._fn_formatter.format(fn_times)
 
-    def write_data(self, data):
-        self._adjust_data(data)
+        return single_data[:_STD_TIMES.start] + std_times + fn_times + single_data[_FN_TIMES.stop:]
+
+    def _flush(self):
         self.writer.writerows(self._buffer)
+        self._buffer.clear()
+
+    def write_data(self, data):
+        self._buffer.append(self._adjust_data(data))
+        if len(self._buffer) >= _WRITE_BATCH_SIZE:
+            self._flush()
 
     def execute_pre_merge(self):
-        self.writer.writeheader()
+        self.writer.writerow(_CSV_COLUMN_ORDER)
+
+    def execute_post_merge(self):
+        pass
 
     def __enter__(self):
-        self.fp = open(self.filename, "w", encoding="utf-8", newline="")
-        self.writer = csv.DictWriter(self.fp, fieldnames=_CSV_COLUMN_ORDER)
+        self.fp = open(self.filename, "w", encoding="utf-8", newline="", buffering=_OUTPUT_BUFFER_SIZE)
+        self.writer = csv.writer(self.fp)
 
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
+        if self._buffer:
+            self._flush()
         self.writer = None
         self.fp.close()
 
 class OutputJSON():
     """Controls file output when the json format is selected.
     """
+    merge_separator = _JSON_SEPARATOR
+
     def __init__(self, filename, args):
         self.filename = filename
         self.fp = None
-        self.time_format = args.time_format
+        self._std_formatter = TimestampFormatter(args.time_format)
+        self._fn_formatter = TimestampFormatter(args.time_format)
+        self._buffer = []
+        self._has_data = False
 
     def _adjust_data(self, single_data):
-        if single_data["std_created"]:
-            single_data["std_created"] = single_data["std_created"].strftime(self.time_format)
-            single_data["std_changed"] = single_data["std_changed"].strftime(self.time_format)
-            single_data["std_mft_change"] = single_data["std_mft_change"].strftime(self.time_format)
-            single_data["std_accessed"] = single_data["std_accessed"].strftime(self.time_format)
-        if single_data["fn_created"]:
-            single_data["fn_created"] = single_data["fn_created"].strftime(self.time_format)
-            single_data["fn_changed"] = single_data["fn_changed"].strftime(self.time_format)
-            single_data["fn_mft_change"] = single_data["fn_mft_change"].strftime(self.time_format)
-            single_data["fn_accessed"] = single_data["fn_accessed"].strftime(self.time_format)
+        std_times, fn_times = single_data[_STD_TIMES], single_data[_FN_TIMES]
+        if single_data.std_created:
+            std_times = self._std_formatter.format(std_times)
+        if single_data.fn_created:
+            fn_times = self._fn_formatter.format(fn_times)
+
+        return single_data[:_STD_TIMES.start] + std_times + fn_times + single_data[_FN_TIMES.stop:]
+
+    def _flush(self):
+        #the records are elements of an array, the separator goes between batches as well
+        if self._has_data:
+            self.fp.write(_JSON_SEPARATOR)
+        self.fp.write(_JSON_SEPARATOR.join(self._buffer))
+        self._buffer.clear()
+        self._has_data = True
 
     def write_data(self, data):
-        self._adjust_data(data)
-        _json_dump(data, self.fp)
+        self._buffer.append(_json_encode(dict(zip(_CSV_COLUMN_ORDER, self._adjust_data(data)))))
+        if len(self._buffer) >= _WRITE_BATCH_SIZE:
+            self._flush()
 
     def execute_pre_merge(self):
-        pass
+        self.fp.write("[\n")
+
+    def execute_post_merge(self):
+        if self._buffer:
+            self._flush()
+        self.fp.write("\n]\n")
 
     def __enter__(self):
-        self.fp = open(self.filename, "w")
+        self.fp = open(self.filename, "w", encoding="utf-8", buffering=_OUTPUT_BUFFER_SIZE)
 
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
+        if self._buffer:
+            self._flush()
         self.fp.close()
 
-class BodyFileDialect(csv.Dialect):
-    """To write the bodyfile, we cheat. By defining a new csv dialect, we can
-    offload all the file writing to the csv module.
-    """
-    delimiter = "|"
-    doublequote = False
-    lineterminator = "\n"
-    quotechar = ""
-    quoting = csv.QUOTE_NONE
+def _convert_time(value):
+    '''An unix timestamp exists only after 1970, if we need to convert something
+    that is before that time, we get an error. This function avoids it.
+    '''
+    return int(value.timestamp()) if value.year >= 1970 else ""
 
 class OutputBodyFile():
     """Controls file output when the bodyfile format is selected.
@@ -124,58 +222,58 @@ class OutputBodyFile():
     mtime = changed time
     ctime = mft changed time
     crtime = createad time
+
+    The format has no quoting or escaping, so the lines are built directly.
     """
+    merge_separator = ""
 
     def __init__(self, filename, args):
         self.filename = filename
         self.fp = None
-        self.writer = None
-        self.use_fn = args.use_fn
+        #the timestamps used depend only on the options, select them once
+        self._times = _FN_TIMES if args.use_fn else _STD_TIMES
+        self._buffer = []
 
     def _get_converted_time(self, data):
-        def convert_time(value):
-            '''An unix timestamp exists only after 1970, if we need to convert something
-            that is before that time, we get an error. This internal function avoids it.
-            '''
-            return int(value.timestamp()) if value.year >= 1970 else ""
-
-        if self.use_fn:
-            if data["fn_created"]:
-                dates = [convert_time(data["fn_accessed"]),
-                         convert_time(data["fn_changed"]),
-                         convert_time(data["fn_mft_change"]),
-                         convert_time(data["fn_created"])]
-            else:
-                dates = ["", "", "", ""]
+        created, changed, mft_change, accessed = data[self._times]
+        if created:
+            dates = (_convert_time(accessed), _convert_time(changed),
+                     _convert_time(mft_change), _convert_time(created))
         else:
-            if data["std_created"]:
-                dates = [convert_time(data["std_accessed"]),
-                         convert_time(data["std_changed"]),
-                         convert_time(data["std_mft_change"]),
-                         convert_time(data["std_created"])]
-            else:
-                dates = ["", "", "", ""]
+            dates = ("", "", "", "")
 
         return dates
 
+    def _flush(self):
+        self.fp.write("".join(self._buffer))
+        self._buffer.clear()
+
     def write_data(self, data):
-        temp = [0, data["path"], data["entry_n"], 0, 0, 0, data["size"]]
-        dates = self._get_converted_time(data)
-        self.writer.writerow(_chain(temp, dates))
+        atime, mtime, ctime, crtime = self._get_converted_time(data)
+        self._buffer.append(f"0|{data.path}|{data.entry_n}|0|0|0|{data.size}|{atime}|{mtime}|{ctime}|{crtime}\n")
+        if len(self._buffer) >= _WRITE_BATCH_SIZE:
+            self._flush()
 
     def execute_pre_merge(self):
         pass
 
+    def execute_post_merge(self):
+        pass
+
     def __enter__(self):
-        self.fp = open(self.filename, "w", encoding="utf-8")
-        self.writer = csv.writer(self.fp, dialect=BodyFileDialect)
+        self.fp = open(self.filename, "w", encoding="utf-8", buffering=_OUTPUT_BUFFER_SIZE)
 
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.writer = None
+        if self._buffer:
+            self._flush()
         self.fp.close()
 
+_OUTPUT_FORMATS = {"csv" : OutputCSV,
+                   "json" : OutputJSON,
+                   "bodyfile" : OutputBodyFile}
+
 #------------------------------------------------------------------------------
 # CLI SECTION
 #------------------------------------------------------------------------------
@@ -184,7 +282,7 @@ def get_arguments():
     to the options.
     '''
     parser = argparse.ArgumentParser(description="Parses a MFT file.")
-    formats = ["csv", "json", "bodyfile"]
+    formats = list(_OUTPUT_FORMATS)
 
     parser.add_argument("-f", "--format", dest="format", metavar="<format>", default="csv", choices=formats, help="Format of the output file.")
     parser.add_argument("--fn", dest="use_fn", action="store_true", help="Specifies if the bodyfile format will use the FILE_NAME attribute for the dates. Valid only for bodyfile output.")
@@ -192,9 +290,10 @@ def get_arguments():
     parser.add_argument("--disable-fixup", dest="disable_fixup", action="store_false", help="Disable the application of the fixup array. Should be used only when trying to get MFT entries from memory.")
     parser.add_argument("-c", "--cores", dest="n_cores", metavar="<cores>", type=int, default=0, help="Control how many cores will be used for processing. 0 will try to use as many cores as possible, 1 disables multiprocessing.")
     parser.add_argument("-t", "--timezone", dest="timezone", metavar="<timezone name>", default="UTC", help="Convert all the times used by the script to the provided timezone. Use '--list-tz' to check available timezones. Default is UTC.")
-    parser.add_argument("--tf", dest="time_format", metavar="<time format>", default="%Y-%m-%d %H:%M:%S", help="How the time information is printed. Use the same format as in the strftime function.")
+    parser.add_argument("--tf", dest="time_format", metavar="<time format>", default=_DEFAULT_TIME_FORMAT, help="How the time information is printed. Use the same format as in the strftime function.")
     parser.add_argument("--list-tz", dest="show_tz", action="store_true", help="Prints a list of all available timezones.")
     parser.add_argument("-o", "--output", dest="output", metavar="<output file>", required=False, help="The filename and path where the resulting file will be saved.")
+    parser.add_argument("--force", dest="force", action="store_true", help="Overwrite the output file if it already exists.")
     parser.add_argument("-i", "--input", dest="input", metavar="<input file>", required=False, help="The MFT file to be processed.")
     parser.add_argument("-v", "--verbose", dest="verbose", action="count", default=0, help="Enables verbose/debug mode.")
 
@@ -206,138 +305,271 @@ def get_arguments():
     if args.use_fn and args.format != "bodyfile":
         parser.error("Argument '--fn' can only be used with 'bodyfile' format.")
 
+    if args.n_cores < 0:
+        parser.error("Argument '-c/--cores' can't be negative.")
+
     if not args.show_tz and (args.input is None or args.output is None):
         parser.error("the following arguments are required: -o/--output, -i/--input")
 
     return args
 
+def get_timezone(name):
+    """Returns the tzinfo for the timezone ``name`` or None if it is unknown.
+
+    zoneinfo, if available, converts the timestamps a lot faster. If it doesn't
+    know the name (e.g., no system timezone database), dateutil is used.
+    """
+    #libmft reads the timestamps as UTC, using the same tzinfo skips the conversion
+    if name in _UTC_NAMES:
+        return _timezone.utc
+    if _zoneinfo is not None:
+        try:
+            return _zoneinfo.ZoneInfo(name)
+        except (_zoneinfo.ZoneInfoNotFoundError, ValueError):
+            pass
+
+    return dateutil.tz.gettz(name)
+
 def print_timezones():
     """List all the available timezones.
 
     Print a three column message with all the timezones available to the
     script.
     """
-    zone_names = list(dateutil.zoneinfo.get_zonefile_instance().zones)
-    zone_names.sort()
-    zone_iter = iter(zone_names)
+    zone_names = sorted(dateutil.zoneinfo.get_zonefile_instance().zones)
     column_number = 3
 
-    names_matrix = [[]]
-    i = 0
-    for name in zone_names:
-        if i == column_number:
-            names_matrix.append([])
-            i = 0
-        names_matrix[-1].append(name)
-        i += 1
-    #if the last line has less than number of columns, add the missing ones
-    fix = column_number - len(names_matrix[-1])
-    for i in range(fix):
-        names_matrix[-1].append("-")
-
-    for names in names_matrix:
-        print("{0:32}{0:32}{0:32}".format(names[0], names[1], names[2]))
+    #if the last line has less than number of columns, fill the missing ones
+    lines = _zip_longest(*[iter(zone_names)] * column_number, fillvalue="-")
+    sys.stdout.write("".join(f"{first:32}{second:32}{third:32}\n" for first, second, third in lines))
 
 #------------------------------------------------------------------------------
 # PROCESSING SECTION
 #------------------------------------------------------------------------------
-def build_data_output(mft, entry, std_info, fn, ds, args):
-    data = {}
-    #get entry related information
-    data["is_deleted"] = entry.is_deleted
-    data["is_directory"] = entry.is_directory
-    data["entry_n"] = entry.header.mft_record
+_ROOT_ENTRY = 5
+_STD_INFO = AttrTypes.STANDARD_INFORMATION
+_IN_USE = MftUsageFlags.IN_USE.value
+_DIRECTORY = MftUsageFlags.DIRECTORY.value
+#plain ints, testing against the IntFlag members goes through the enum machinery
+_READ_ONLY = FileInfoFlags.READ_ONLY.value
+_HIDDEN = FileInfoFlags.HIDDEN.value
+_SYSTEM = FileInfoFlags.SYSTEM.value
+_ENCRYPTED = FileInfoFlags.ENCRYPTED.value
+#maps (entry number, sequence number) of a directory to (orphan, path)
+_PATH_CACHE = {}
+#MFT loaded by the parent process, inherited by the workers when forked
+_SHARED_MFT = None
+#(args, mft_config) of a pool process, set once when it starts
+_WORKER_OPTIONS = None
+
+def _get_directory_path(mft, index, seq):
+    """Returns the path of a directory, walking the parent chain only until
+    a directory that has already been resolved is found.
+
+    Every directory visited during the walk is added to the cache, so siblings
+    and children of the same directory reuse the work. The result follows the
+    same format as libmft, a tuple (orphan, path) where the path does not have
+    the root.
+    """
+    cached = _PATH_CACHE.get((index, seq))
+    if cached is not None:
+        return cached
+
+    chain = []
+    visited = set()
+    orphan, path = False, ""
+    #search until hit the root entry or a known directory
+    while index != _ROOT_ENTRY:
+        cached = _PATH_CACHE.get((index, seq))
+        if cached is not None:
+            orphan, path = cached
+            break
+        #corrupted parent references can form a loop, it never reaches the root = orphan
+        if index in visited:
+            orphan = True
+            break
+        visited.add(index)
+        try:
+            parent_entry = mft[index]
+        except (ValueError, IndexError):
+            #if the entry itself no longer exists = orphan
+            parent_entry = None
+        #if the sequence number is wrong, something changed = orphan
+        if parent_entry is None or seq != parent_entry.header.seq_number:
+            orphan = True
+            break
+        parent_fn = parent_entry.get_main_filename_attr()
+        if parent_fn is None:
+            orphan = True
+            break
+        chain.append(((index, seq), parent_fn.content.name))
+        index, seq = parent_fn.content.parent_ref, parent_fn.content.parent_seq
+
+    #build the path from the top, caching every intermediate directory
+    for key, name in chain[::-1]:
+        path = "\\".join((path, name)) if path else name
+        _PATH_CACHE[key] = (orphan, path)
+
+    return (orphan, path)
+
+def _cache_directory_path(mft, index, entry, fn):
+    """Adds a directory found while going over the MFT to the path cache, so
+    its children don't need to read and parse it again. ``index`` is the
+    position of the entry in the MFT.
+    """
+    header = entry.header
+    #the number in the header might not be the entry position (e.g., entries
+    #carved from memory) and the children point to the position
+    if header.mft_record != index or index == _ROOT_ENTRY:
+        return
+    fn_content = fn.content
+    orphan, path = _get_directory_path(mft, fn_content.parent_ref, fn_content.parent_seq)
+    _PATH_CACHE[(header.mft_record, header.seq_number)] = \
+        (orphan, "\\".join((path, fn_content.name)) if path else fn_content.name)
+
+def get_full_path(mft, fn):
+    """Returns a tuple (orphan, path) with the full path of a FILENAME attribute.
+    Same result as ``mft.get_full_path``, but using the module path cache.
+    """
+    fn_content = fn.content
+    orphan, path = _get_directory_path(mft, fn_content.parent_ref, fn_content.parent_seq)
 
+    return (orphan, "\\".join((path, fn_content.name)))
+
+def build_entry_base(entry, usage_flags, std_info, args):
+    """Builds the values that are the same for all the records of an entry,
+    the entry information, STANDARD_INFORMATION timestamps and flags.
+    ``usage_flags`` are the header usage flags of the entry, as an int.
+    """
+    entry_header = entry.header
     #get STANDARD_INFORMATION timestamps
     if std_info is not None:
         std_info_content = std_info.content
         std_info_ti = std_info_content.timestamps.astimezone(args.timezone)
-        data["std_created"] = std_info_ti.created
-        data["std_changed"] = std_info_ti.changed
-        data["std_mft_change"] = std_info_ti.mft_changed
-        data["std_accessed"] = std_info_ti.accessed
+        std_created, std_changed, std_mft_change, std_accessed = \
+            std_info_ti.created, std_info_ti.changed, std_info_ti.mft_changed, std_info_ti.accessed
         #get STANDARD_INFORMATION related info
-        data["readonly"] = True if std_info_content.flags & libmft.flagsandtypes.FileInfoFlags.READ_ONLY else False
-        data["hidden"] = True if std_info_content.flags & libmft.flagsandtypes.FileInfoFlags.HIDDEN else False
-        data["system"] = True if std_info_content.flags & libmft.flagsandtypes.FileInfoFlags.SYSTEM else False
-        data["encrypted"] = True if std_info_content.flags & libmft.flagsandtypes.FileInfoFlags.ENCRYPTED else False
+        flags = int(std_info_content.flags)
+        readonly, hidden, system, encrypted = bool(flags & _READ_ONLY), \
+            bool(flags & _HIDDEN), bool(flags & _SYSTEM), bool(flags & _ENCRYPTED)
     else:
-        data["std_created"] = data["std_changed"] = data["std_mft_change"] = \
-            data["std_accessed"] = data["readonly"] = data["hidden"] = data["system"] = \
-            data["encrypted"] = ""
+        std_created = std_changed = std_mft_change = std_accessed = \
+            readonly = hidden = system = encrypted = ""
+
+    return (entry_header.mft_record, not usage_flags & _IN_USE, bool(usage_flags & _DIRECTORY),
+        std_created, std_changed, std_mft_change, std_accessed,
+        readonly, hidden, system, encrypted)
+
+def build_data_output(entry_base, fn_ti, full_path, ds):
+    """Builds the record of one entry for a FILENAME and datastream.
+    ``entry_base`` is the result of ``build_entry_base`` for the entry,
+    ``fn_ti`` are the FILENAME timestamps, already in the output timezone, and
+    ``full_path`` is the (orphan, path) tuple for the FILENAME. As they are
+    shared by all the datastreams of the entry, they are resolved by the caller.
+    """
+    entry_n, is_deleted, is_directory, std_created, std_changed, std_mft_change, \
+        std_accessed, readonly, hidden, system, encrypted = entry_base
     #get FILENAME timestamps
-    if fn is not None:
-        fn_content = fn.content
-        fn_ti = fn_content.timestamps.astimezone(args.timezone)
-        data["fn_created"] = fn_ti.created
-        data["fn_changed"] = fn_ti.changed
-        data["fn_mft_change"] = fn_ti.mft_changed
-        data["fn_accessed"] = fn_ti.accessed
-        #get the full path
-        orphan, data["path"] = mft.get_full_path(fn)
+    if fn_ti is not None:
+        fn_created, fn_changed, fn_mft_change, fn_accessed = \
+            fn_ti.created, fn_ti.changed, fn_ti.mft_changed, fn_ti.accessed
+        orphan, path = full_path
         #fix path if it is ads
         if ds is None or ds.name is None:
-            data["is_ads"] = False
+            is_ads = False
         else:
-            data["path"] = ":".join((data["path"], ds.name))
-            data["is_ads"] = True
+            path = f"{path}:{ds.name}"
+            is_ads = True
     else:
-        data["fn_created"] = data["fn_changed"] = data["fn_mft_change"] = \
-            data["fn_accessed"] = ""
+        fn_created = fn_changed = fn_mft_change = fn_accessed = ""
         #if we have no filename attr, path cant be calculated
         orphan = False
-        data["path"] = ""
-        data["is_ads"] = False
+        path = ""
+        is_ads = False
 
     #if we have an orphan path, let's make it clear
     if orphan:
-        data["path"] = "\\".join(("__ORPHAN__", data["path"]))
+        path = "\\".join(("__ORPHAN__", path))
     #get size from the datastream
     if ds is not None:
-        data["size"] = ds.size
-        data["alloc_size"] = ds.alloc_size
+        size, alloc_size = ds.size, ds.alloc_size
     else:
-        data["size"] = data["alloc_size"] = "0"
+        size = alloc_size = "0"
+
+    return EntryData(entry_n, is_deleted, is_directory, is_ads, path, size, alloc_size,
+        std_created, std_changed, std_mft_change, std_accessed,
+        fn_created, fn_changed, fn_mft_change, fn_accessed,
+        readonly, hidden, system, encrypted)
 
-    return data
 
+def _iter_entries(mft, start, end):
+    """Same as ``mft.splice_generator``, but yields (position, entry)."""
+    for index in range(start, end):
+        for entry in mft.splice_generator(index, index + 1):
+            yield index, entry
 
 def iter_mft_data(mft, args, start, end):
-    for entry in mft.splice_generator(start, end):
+    for index, entry in _iter_entries(mft, start, end):
+        usage_flags = int(entry.header.usage_flags)
+        in_use = usage_flags & _IN_USE
         #sometimes entries have no attributes and are marked as deleted, there is no information there
-        if not entry.attrs and entry.is_deleted:
+        if not entry.attrs and not in_use:
             continue
         #other times, we might have a partial entry (entry that has been deleted,
         #but occupied more than one entry) and not have the basic attribute information
         #like STANDARD_INFORMATION or FILENAME, in these cases, ignore as well
-        if not entry.is_deleted and not entry.has_attribute(AttrTypes.STANDARD_INFORMATION):
+        std_attrs = entry.get_attributes(_STD_INFO)
+        if in_use and std_attrs is None:
             continue
 
-        std_info = entry.get_attributes(AttrTypes.STANDARD_INFORMATION)[0]
+        #the STANDARD_INFORMATION is shared by all the records of the entry
+        entry_base = build_entry_base(entry, usage_flags, std_attrs[0] if std_attrs else None, args)
         fn_attrs = entry.get_unique_filename_attrs()
         main_fn = entry.get_main_filename_attr()
-        ds_names = entry.get_datastream_names()
-        main_ds = entry.get_datastream()
+        data_streams = entry.data_streams
+        main_ds = None
         #if the entry has no FILENAME attributes, build the default
         if not fn_attrs:
             fn_attrs = [None]
             main_fn = None
+            main_path = main_fn_ti = None
+        else:
+            #the path and timestamps are the same for all the datastreams, resolve them only once
+            main_path = get_full_path(mft, main_fn)
+            main_fn_ti = main_fn.content.timestamps.astimezone(args.timezone)
+            if usage_flags & _DIRECTORY:
+                _cache_directory_path(mft, index, entry, main_fn)
         # with the main filename found, let's find the ads and return
-        if ds_names is not None:
-            for ds_name in ds_names:
-                yield build_data_output(mft, entry, std_info, main_fn, entry.get_datastream(ds_name), args)
+        if data_streams:
+            for ds in data_streams:
+                #keep the main datastream for the hardlinks
+                if ds.name is None:
+                    main_ds = ds
+                yield build_data_output(entry_base, main_fn_ti, main_path, ds)
         else:
-            yield build_data_output(mft, entry, std_info, main_fn, main_ds, args)
+            yield build_data_output(entry_base, main_fn_ti, main_path, None)
         #iterate over the hardlinks
         if main_fn:
+            main_parent = main_fn.content.parent_ref
             for fn in fn_attrs:
-                if fn.content.parent_ref != main_fn.content.parent_ref: #if it is the same file name (which was printed)
-                    yield build_data_output(mft, entry, std_info, fn, main_ds, args)
+                if fn.content.parent_ref != main_parent: #if it is the same file name (which was printed)
+                    yield build_data_output(entry_base, fn.content.timestamps.astimezone(args.timezone),
+                        get_full_path(mft, fn), main_ds)
 
 def worker(id, output_file, args, mft_config):
 
     with open(args.input, "rb") as input_file:
-        mft = libmft.api.MFT(input_file, mft_config)
+        #the entries are read in order, let the system read ahead more aggressively
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(input_file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        if _SHARED_MFT is not None:
+            #the file position can't be shared with the other processes
+            mft = _SHARED_MFT
+            mft.file_pointer = input_file
+        else:
+            mft = libmft.api.MFT(input_file, mft_config)
+        #the path cache is only valid for one MFT
+        _PATH_CACHE.clear()
         #calculate the offset that this process is going to work on
         total, remainder = divmod(mft.total_amount_entries, args.n_cores)
         start = id * total
@@ -346,8 +578,13 @@ def worker(id, output_file, args, mft_config):
 
         #open the correct output and spit things out :D
         with args.output_class(output_file, args) as output:
+            #if there is no merge, the only worker writes directly to the final file
+            if args.n_cores == 1:
+                output.execute_pre_merge()
             for data in iter_mft_data(mft, args, start, end):
                 output.write_data(data)
+            if args.n_cores == 1:
+                output.execute_post_merge()
 
     return output_file
 
@@ -355,21 +592,79 @@ def worker(id, output_file, args, mft_config):
 # MAIN SECTION
 #------------------------------------------------------------------------------
 def generate_name_file(id, output_name):
-    #TODO use a better algorithm to get the names
-    v = 1
-    while True:
-        temp_name = (v * str(id)) + output_name
-        if not os.path.exists(temp_name):
-            return temp_name
+    """Creates an empty intermediate file for a worker, next to the output
+    file, and returns its name. The name is unique and reserved atomically.
+    """
+    fd, temp_name = tempfile.mkstemp(prefix=f"spymaster.{id}.", suffix=".tmp",
+        dir=os.path.dirname(os.path.abspath(output_name)))
+    os.close(fd)
+
+    return temp_name
+
+def _append_file(output_fp, file):
+    """Appends the contents of ``file`` to the text file ``output_fp``.
+
+    The intermediate files are already encoded, so the bytes are copied as
+    they are, bypassing the text layer (and its newline translation).
+    """
+    output_fp.flush()
+    with open(file, "rb") as input_file:
+        if _USE_SENDFILE:
+            in_fd, out_fd = input_file.fileno(), output_fp.fileno()
+            size, offset = os.fstat(in_fd).st_size, 0
+            while offset < size:
+                offset += os.sendfile(out_fd, in_fd, offset, size - offset)
         else:
-            v += 1
+            shutil.copyfileobj(input_file, output_fp.buffer, _MERGE_CHUNK_SIZE)
+            output_fp.buffer.flush()
+
+def _init_pool_process(args, mft_config):
+    """Keeps the options, that are the same for all the workers, in the pool
+    process, so they are not sent again with every task."""
+    global _WORKER_OPTIONS
+
+    _WORKER_OPTIONS = (args, mft_config)
+
+def _pool_worker(id, output_file):
+    return worker(id, output_file, *_WORKER_OPTIONS)
+
+def run_workers(file_list, args, mft_config):
+    """Runs all the workers in a process pool, one for each intermediate file.
+
+    If the processes can be forked, the MFT is loaded only once, by the parent,
+    and the workers inherit it instead of going over the whole file again.
+    """
+    global _SHARED_MFT
+
+    pool_options = {"initializer" : _init_pool_process, "initargs" : (args, mft_config)}
+    if "fork" not in mp.get_all_start_methods():
+        with mp.Pool(args.n_cores, **pool_options) as pool:
+            pool.starmap(_pool_worker, enumerate(file_list))
+        return
+
+    with open(args.input, "rb") as input_file:
+        #all the workers read the file, ask the system to start loading it in memory
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(input_file.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+        _SHARED_MFT = libmft.api.MFT(input_file, mft_config)
+        try:
+            with mp.get_context("fork").Pool(args.n_cores, **pool_options) as pool:
+                pool.starmap(_pool_worker, enumerate(file_list))
+        finally:
+            _SHARED_MFT = None
 
 def merge_files(file_list, args):
     with args.output_class(args.output, args) as output_file:
         output_file.execute_pre_merge()
+        separator = ""
         for file in file_list:
-            with open(file, "r", encoding="utf-8") as input_file:
-                shutil.copyfileobj(input_file, output_file.fp)
+            #a worker might not have generated anything, don't separate nothing
+            if not os.path.getsize(file):
+                continue
+            output_file.fp.write(separator)
+            _append_file(output_file.fp, file)
+            separator = output_file.merge_separator
+        output_file.execute_post_merge()
 
 def remove_temp_files(file_list):
     _MOD_LOGGER.info(f"Removing intermediate files...")
@@ -387,22 +682,21 @@ def process_program_args(args):
     if args.show_tz:
         print_timezones()
         sys.exit(0)
-    args.timezone = dateutil.tz.gettz(args.timezone)
+    timezone = get_timezone(args.timezone)
+    if timezone is None:
+        _MOD_LOGGER.error(f"Unknown timezone '{args.timezone}'. Use '--list-tz' to check available timezones.")
+        sys.exit(1)
+    args.timezone = timezone
 
     if not os.path.isfile(args.input):
         _MOD_LOGGER.error(f"Path provided '{args.input}' is not a file or does not exists.")
         sys.exit(1)
 
     if args.n_cores == 0:
-        #never use all the cores, leave one for the others
-        args.n_cores = mp.cpu_count() - 1
+        #never use all the cores, leave one for the others, unless there is only one
+        args.n_cores = max(1, mp.cpu_count() - 1)
 
-    if args.format == "csv":
-        args.output_class = OutputCSV
-    elif args.format == "json":
-        args.output_class = OutputJSON
-    elif args.format == "bodyfile":
-        args.output_class = OutputBodyFile
+    args.output_class = _OUTPUT_FORMATS[args.format]
 
 def main():
     _MOD_LOGGER.addHandler(logging.StreamHandler(sys.stderr))
@@ -426,9 +720,13 @@ def main():
 
     _MOD_LOGGER.debug("Provided options: %s", args)
 
-    if os.path.exists(args.output):
-        _MOD_LOGGER.warning(f"The output file '{args.output}' exists and will be overwritten. You have 5 seconds to cancel the execution (CTRL+C).")
-        time.sleep(5)
+    #creating the output here fails if it exists, without a window for a race
+    if not args.force:
+        try:
+            open(args.output, "x").close()
+        except FileExistsError:
+            _MOD_LOGGER.error(f"The output file '{args.output}' exists. Use '--force' to overwrite it.")
+            sys.exit(1)
 
     #TODO some kind of progress bar
     #TODO dump all resident files
@@ -436,27 +734,31 @@ def main():
     #TODO symbolic links and junction points
 
     start_time = time.time()
-    if args.dump_entry is None:
-        if args.n_cores == 1:
-            worker(0, args.output, args, mft_config)
+    try:
+        if args.dump_entry is None:
+            if args.n_cores == 1:
+                worker(0, args.output, args, mft_config)
+            else:
+                file_list = []
+                #the intermediate files are removed even if a worker or the merge fails
+                try:
+                    for i in range(args.n_cores):
+                        file_list.append(generate_name_file(i, args.output))
+                    run_workers(file_list, args, mft_config)
+                    merge_files(file_list, args)
+                finally:
+                    remove_temp_files(file_list)
         else:
-            process_args = [(i, generate_name_file(i, args.output), args, mft_config) for i in range(args.n_cores)]
-            #TODO there is a potential race condition here, fix
-            # if two are started at the same time for a mft file, it is possible that
-            # both process try to generate the same name before the creation of the
-            # file. If this happens, you have two processes writing in the same file,
-            # hence, race condition.
-            file_list = [p_arg[1] for p_arg in process_args]
-            with mp.Pool(args.n_cores) as pool:
-                pool.starmap(worker, process_args)
-                merge_files(file_list, args)
-            remove_temp_files(file_list)
-    else:
-        _MOD_LOGGER.info(f"Dumping entry '{args.dump_entry}' to file '{args.output}'.")
-        try:
-            dump_resident_file(mft, args.output, args.dump_entry)
-        except SpymasterError as e:
-            _MOD_LOGGER.error(str(e))
+            _MOD_LOGGER.info(f"Dumping entry '{args.dump_entry}' to file '{args.output}'.")
+            try:
+                dump_resident_file(mft, args.output, args.dump_entry)
+            except SpymasterError as e:
+                _MOD_LOGGER.error(str(e))
+    except BaseException:
+        #the output didn't exist before this run, don't leave a broken one behind
+        if not args.force and os.path.exists(args.output):
+            os.remove(args.output)
+        raise
 
     end_time = time.time()
     _MOD_LOGGER.info(f"Execution time: {end_time - start_time}")